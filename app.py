@@ -1,10 +1,19 @@
 import streamlit as st
 import pandas as pd
 import logging
-import requests
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 # Import functions from other modules
-from src.spotify_client import FEATURES_ENDPOINT, get_spotify_token, search_tracks
+from src.async_client import (
+    SpotifyAPIError,
+    fetch_features,
+    get_client_session,
+    run,
+    search_tracks,
+)
+from src.config import get_config
+from src.spotify_client import TOKEN_EXPIRY_MARGIN, get_spotify_token
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,20 +23,78 @@ logger = logging.getLogger(__name__)
 st.set_page_config(layout="wide")
 st.title("Spotify Audio Features Analysis")
 
-# Access Spotify configuration from Streamlit secrets
-CLIENT_ID = st.secrets["spotify"]["CLIENT_ID"]
-CLIENT_SECRET = st.secrets["spotify"]["CLIENT_SECRET"]
-FEATURES_ENDPOINT = st.secrets["spotify"]["FEATURES_ENDPOINT"]
 
-# Initialize token in session state if not present
-if "spotify_token" not in st.session_state:
-    st.session_state.spotify_token = None
+@st.cache_resource(ttl=3000, show_spinner=False)
+def get_spotify_token_cached(client_id: str, client_secret: str) -> Optional[Tuple[str, float]]:
+    """
+    Fetches the Spotify token once per process, sharing it across all user sessions.
 
-token = get_spotify_token(CLIENT_ID, CLIENT_SECRET)
-if token:
+    Returns:
+        A tuple of the access token and its time.monotonic() expiry, or None if an error occurred.
+    """
+    token_info = get_spotify_token(client_id, client_secret)
+    if not token_info:
+        return None
+
+    token, expires_in = token_info
+    return token, time.monotonic() + expires_in
+
+
+def ensure_token() -> Optional[str]:
+    """
+    Returns the session's Spotify token, requesting a new one only once the cached token is about to expire.
+    """
+    token = st.session_state.get("spotify_token")
+    expires_at = st.session_state.get("token_expires_at", 0)
+    if token and time.monotonic() < expires_at - TOKEN_EXPIRY_MARGIN:
+        return token
+
+    config = get_config()
+    token_info = get_spotify_token_cached(config.client_id, config.client_secret)
+    if token_info and time.monotonic() >= token_info[1] - TOKEN_EXPIRY_MARGIN:
+        # The shared token is about to expire as well, so fetch a fresh one
+        get_spotify_token_cached.clear()
+        token_info = get_spotify_token_cached(config.client_id, config.client_secret)
+
+    if not token_info:
+        # Don't keep a failed attempt cached for the whole TTL
+        get_spotify_token_cached.clear()
+        st.session_state.spotify_token = None
+        st.session_state.auth_headers = None
+        return None
+
+    token, expires_at = token_info
     st.session_state.spotify_token = token
-else:
-    st.session_state.spotify_token = None
+    st.session_state.auth_headers = {"Authorization": f"Bearer {token}"}
+    st.session_state.token_expires_at = expires_at
+    return token
+
+
+@st.cache_data(ttl=300, max_entries=128, show_spinner=False)
+def cached_search(query: str, limit: int, _auth_headers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Searches for tracks, caching results by (query, limit).
+
+    The auth headers are excluded from the cache key since they change on every token refresh.
+    Failures raise SpotifyAPIError, so only successful responses are cached.
+    """
+    return run(search_tracks(get_client_session(), _auth_headers, query, limit=limit))
+
+
+@st.cache_data(ttl=300, max_entries=128, show_spinner=False)
+def cached_features(
+    track_ids: Tuple[str, ...], _auth_headers: Dict[str, str]
+) -> List[Dict[str, Any]]:
+    """
+    Fetches audio features, caching results by the given track IDs.
+
+    Callers should pass the IDs sorted so that ordering does not bust the cache.
+    Failures raise SpotifyAPIError, so only successful responses are cached.
+    """
+    return run(fetch_features(get_client_session(), _auth_headers, list(track_ids)))
+
+
+if not ensure_token():
     st.error("Failed to get token. Check credentials.")
 
 if not st.session_state.spotify_token:
@@ -52,24 +119,53 @@ if submit_search:
     elif not search_query:
         st.warning("Please enter a search query.")
     else:
-        with st.spinner(f"Searching for '{search_query}'..."):
-            tracks_raw = search_tracks(token, search_query, limit=search_limit)
+        try:
+            with st.spinner(f"Searching for '{search_query}'..."):
+                tracks_raw = cached_search(search_query, search_limit, st.session_state.auth_headers)
+        except SpotifyAPIError as e:
+            st.error(str(e))
+            st.stop()
+
+        # Collect track information column by column, skipping duplicate IDs
+        ids, names, artists, albums = [], [], [], []
+        seen_ids = set()
+        for track in tracks_raw:
+            if not track or not track.get("id") or track["id"] in seen_ids:
+                continue
+            seen_ids.add(track["id"])
+            ids.append(track["id"])
+            names.append(track["name"])
+            artists.append(", ".join(artist["name"] for artist in track["artists"]))
+            albums.append(track["album"]["name"])
 
-        if not tracks_raw:
+        if not ids:
             st.warning("No tracks found for your query.")
         else:
             # Create DataFrame for track information
-            df_tracks = pd.DataFrame([
-                {
-                    "id": track["id"],
-                    "name": track["name"],
-                    "artist": ", ".join(artist["name"] for artist in track["artists"]),
-                    "album": track["album"]["name"]
-                }
-                for track in tracks_raw if track and track.get("id")
-            ]).drop_duplicates(subset=["id"])
+            df_tracks = pd.DataFrame(
+                {"id": ids, "name": names, "artist": artists, "album": albums}
+            )
 
             st.subheader(f"Fetched Tracks ({len(df_tracks)})")
             st.dataframe(df_tracks[["name", "artist", "album"]])
 
-            track_ids = df_tracks["id"].tolist()
\ No newline at end of file
+            try:
+                with st.spinner("Fetching audio features..."):
+                    features_data = cached_features(
+                        tuple(sorted(ids)), st.session_state.auth_headers
+                    )
+            except SpotifyAPIError as e:
+                st.error(str(e))
+                st.stop()
+
+            if not features_data:
+                st.warning("No audio features available for these tracks.")
+            else:
+                # The cache key is sorted, so restore the search order of the tracks
+                features_by_id = {features["id"]: features for features in features_data}
+                df_features = pd.DataFrame(
+                    [features_by_id[track_id] for track_id in ids if track_id in features_by_id]
+                )
+
+                st.subheader("Audio Features")
+                st.dataframe(df_features)
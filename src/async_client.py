@@ -0,0 +1,294 @@
+import asyncio
+import atexit
+import logging
+import threading
+import weakref
+from typing import Any, Awaitable, Dict, List, NamedTuple, TypeVar
+
+import aiohttp
+import ijson
+import orjson
+import streamlit as st
+
+from src.config import get_config
+from src.spotify_client import MAX_RETRIES, RETRY_STATUSES, retry_delay
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of simultaneous connections held by the shared session
+CONNECTION_LIMIT = 20
+# The audio-features endpoint accepts at most 100 IDs per request
+FEATURES_BATCH_SIZE = 100
+# Upper bound on in-flight audio-features requests across all sessions,
+# to stay under Spotify's rate limit
+MAX_CONCURRENT_REQUESTS = 10
+# Seconds to wait for the aiohttp session to close when it is released
+CLOSE_TIMEOUT = 5
+
+T = TypeVar("T")
+
+
+class SpotifyAPIError(Exception):
+    """
+    Raised when a Spotify API request fails. The message is suitable for showing to the user.
+    """
+
+
+class _Client(NamedTuple):
+    loop: asyncio.AbstractEventLoop
+    session: aiohttp.ClientSession
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+    loop.run_forever()
+    loop.close()
+
+
+async def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(limit=CONNECTION_LIMIT)
+    return aiohttp.ClientSession(connector=connector)
+
+
+# One request semaphore per event loop, shared by every fetch_features call on it
+_request_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"
+_request_semaphores = weakref.WeakKeyDictionary()
+
+
+def _get_request_semaphore() -> asyncio.Semaphore:
+    """
+    Returns the semaphore bounding in-flight requests on the running event loop.
+
+    Must be called from a coroutine; the semaphore is created lazily on first use.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _request_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _request_semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    return semaphore
+
+
+def _release_client(client: _Client) -> None:
+    """
+    Closes the client's session and stops its event loop.
+
+    Called when the client is evicted from the resource cache and at process exit,
+    so it is a no-op once the loop has already stopped.
+
+    Args:
+        client: The client to release.
+    """
+    if not client.loop.is_running():
+        return
+    future = asyncio.run_coroutine_threadsafe(client.session.close(), client.loop)
+    try:
+        future.result(timeout=CLOSE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Could not close the aiohttp session cleanly: {e}")
+    client.loop.call_soon_threadsafe(client.loop.stop)
+
+
+@st.cache_resource(show_spinner=False, on_release=_release_client)
+def _get_client() -> _Client:
+    """
+    Returns the process-wide event loop and aiohttp session, creating them on first use.
+
+    The loop runs on a background thread and the session is bound to it, so both are
+    shared by all Streamlit sessions. They are released together when the cache entry
+    is cleared or the process exits.
+
+    Returns:
+        The process-wide client.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(
+        target=_run_loop, args=(loop,), name="spotify-client-loop", daemon=True
+    ).start()
+    session = asyncio.run_coroutine_threadsafe(_create_session(), loop).result()
+    client = _Client(loop, session)
+    atexit.register(_release_client, client)
+    return client
+
+
+def run(coro: Awaitable[T]) -> T:
+    """
+    Runs a coroutine to completion on the process-wide event loop.
+
+    Args:
+        coro: The coroutine to run.
+
+    Returns:
+        The coroutine's result.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_client().loop).result()
+
+
+def get_client_session() -> aiohttp.ClientSession:
+    """
+    Returns the process-wide aiohttp session, creating it on first use.
+
+    All Streamlit sessions share its connection pool.
+
+    Returns:
+        A ClientSession bound to the process-wide event loop.
+    """
+    return _get_client().session
+
+
+async def _get_with_backoff(
+    session: aiohttp.ClientSession, url: str, **kwargs: Any
+) -> aiohttp.ClientResponse:
+    """
+    Sends a GET request, retrying on rate limiting and transient server errors.
+
+    Honours the Retry-After header when present, otherwise backs off exponentially
+    with jitter. The caller is responsible for releasing the returned response.
+
+    Args:
+        session: The aiohttp session to issue the request with.
+        url: The URL to request.
+        **kwargs: Passed through to session.get.
+
+    Returns:
+        The successful response.
+
+    Raises:
+        aiohttp.ClientResponseError: If the final response is an HTTP error.
+    """
+    attempt = 0
+    while True:
+        response = await session.get(url, **kwargs)
+        if response.status not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+            response.raise_for_status()
+            return response
+
+        delay = retry_delay(response.headers.get("Retry-After"), attempt)
+        response.release()
+        logger.warning(f"Spotify returned HTTP {response.status}, retrying in {delay:.1f}s.")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _slim_track(track: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": track.get("id"),
+        "name": track.get("name"),
+        "artists": [
+            {"name": artist["name"]}
+            for artist in track.get("artists") or []
+            if artist and artist.get("name")
+        ],
+        "album": {"name": (track.get("album") or {}).get("name")},
+    }
+
+
+async def search_tracks(
+    session: aiohttp.ClientSession, auth_headers: Dict[str, str], query: str, limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Searches for tracks on Spotify.
+
+    The response is parsed as it streams in, keeping only the fields the app uses,
+    so the full JSON document is never held in memory.
+
+    Args:
+        session: The aiohttp session to issue the request with.
+        auth_headers: Authorization headers carrying the Spotify API access token.
+        query: The search query string.
+        limit: The maximum number of tracks to return (capped at 50).
+
+    Returns:
+        A list of track dictionaries with id, name, artists and album,
+        or an empty list if no results are found.
+
+    Raises:
+        SpotifyAPIError: If the token is missing or the request fails.
+    """
+    if not auth_headers:
+        raise SpotifyAPIError("Invalid or missing Spotify token.")
+
+    params = {"q": query, "type": "track", "limit": min(limit, 50)}  # API limit is 50
+
+    logger.debug(f"Search params: {params}")
+
+    try:
+        async with await _get_with_backoff(
+            session, get_config().search_endpoint, headers=auth_headers, params=params
+        ) as response:
+            tracks = [
+                _slim_track(track)
+                async for track in ijson.items_async(
+                    response.content, "tracks.items.item", use_float=True
+                )
+                if track
+            ]
+
+        logger.info(f"Found {len(tracks)} tracks for query: '{query}'")
+        return tracks
+
+    except aiohttp.ClientError as e:
+        logger.error(f"Error searching tracks: {e}")
+        raise SpotifyAPIError(f"API error during track search: {e}") from e
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during track search: {e}")
+        raise SpotifyAPIError("An unexpected error occurred during track search.") from e
+
+
+async def _fetch_features_batch(
+    session: aiohttp.ClientSession,
+    headers: Dict[str, str],
+    ids: List[str],
+    semaphore: asyncio.Semaphore,
+) -> List[Dict[str, Any]]:
+    params = {"ids": ",".join(ids)}
+    async with semaphore:
+        async with await _get_with_backoff(
+            session, get_config().features_endpoint, headers=headers, params=params
+        ) as response:
+            data = await response.json(loads=orjson.loads)
+    # Spotify returns null for tracks without audio features
+    return [features for features in data.get("audio_features", []) if features]
+
+
+async def fetch_features(
+    session: aiohttp.ClientSession, auth_headers: Dict[str, str], ids: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    Fetches audio features for a list of tracks.
+
+    IDs are split into batches of FEATURES_BATCH_SIZE which are requested concurrently.
+
+    Args:
+        session: The aiohttp session to issue the requests with.
+        auth_headers: Authorization headers carrying the Spotify API access token.
+        ids: Spotify track IDs.
+
+    Returns:
+        A list of audio feature dictionaries in the order of ids, omitting tracks without
+        features.
+
+    Raises:
+        SpotifyAPIError: If the token is missing or a request fails.
+    """
+    if not auth_headers:
+        raise SpotifyAPIError("Invalid or missing Spotify token.")
+    if not ids:
+        return []
+
+    batches = [ids[i:i + FEATURES_BATCH_SIZE] for i in range(0, len(ids), FEATURES_BATCH_SIZE)]
+    semaphore = _get_request_semaphore()
+
+    try:
+        results = await asyncio.gather(
+            *(_fetch_features_batch(session, auth_headers, batch, semaphore) for batch in batches)
+        )
+
+        features = [feature for batch_features in results for feature in batch_features]
+        logger.info(f"Fetched audio features for {len(features)} tracks in {len(batches)} request(s).")
+        return features
+
+    except aiohttp.ClientError as e:
+        logger.error(f"Error fetching audio features: {e}")
+        raise SpotifyAPIError(f"API error while fetching audio features: {e}") from e
+    except Exception as e:
+        logger.error(f"An unexpected error occurred while fetching audio features: {e}")
+        raise SpotifyAPIError("An unexpected error occurred while fetching audio features.") from e
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+import streamlit as st
+
+
+@st.cache_resource(show_spinner=False)
+def get_config() -> SimpleNamespace:
+    """
+    Reads the Spotify configuration from Streamlit secrets once per process.
+
+    Returns:
+        A namespace with client_id, client_secret, account_url, search_endpoint
+        and features_endpoint.
+    """
+    secrets = st.secrets["spotify"]
+    return SimpleNamespace(
+        client_id=secrets["CLIENT_ID"],
+        client_secret=secrets["CLIENT_SECRET"],
+        account_url=secrets["ACCOUNT_URL"],
+        search_endpoint=secrets["SEARCH_ENDPOINT"],
+        features_endpoint=secrets["FEATURES_ENDPOINT"],
+    )
@@ -1,28 +1,224 @@
 import base64
+import contextlib
 import logging
-from typing import Any, Dict, List, Optional
-
+import math
+import os
+import pathlib
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-SPOTIFY_ACCOUNT_URL = st.secrets["spotify"]["ACCOUNT_URL"]
-SEARCH_ENDPOINT = st.secrets["spotify"]["SEARCH_ENDPOINT"]
-FEATURES_ENDPOINT = st.secrets["spotify"]["FEATURES_ENDPOINT"]
+from src.config import get_config
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_spotify_token(client_id: str, client_secret: str) -> Optional[str]:
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+# Upper bound in seconds on a single retry delay (Spotify's rate limit window is 30s)
+MAX_RETRY_DELAY = 30
+
+# Shared session so that repeated calls reuse pooled keep-alive connections.
+# The adapter only retries connection errors; HTTP statuses are retried by
+# _post_with_backoff so that Retry-After waits stay capped.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(
+            total=MAX_RETRIES,
+            backoff_factor=0.5,
+            allowed_methods=["GET", "POST"],
+            respect_retry_after_header=False,
+        ),
+    ),
+)
+
+
+# Token requests in progress, keyed by client ID, so concurrent callers share one request
+_token_refresh_inflight: Dict[str, Future] = {}
+_token_refresh_lock = threading.Lock()
+
+# Tokens are persisted here so a still-valid token survives process restarts
+_TOKEN_CACHE_PATH = pathlib.Path.home() / ".cache" / "spotify_helper" / "token.json"
+# Treat a token as expired this many seconds before it actually expires
+TOKEN_EXPIRY_MARGIN = 60
+
+
+def retry_delay(retry_after: Optional[str], attempt: int) -> float:
+    """
+    Returns how long to wait before retrying a rate-limited or failed request.
+
+    Args:
+        retry_after: The response's Retry-After header, if any.
+        attempt: The number of retries already made.
+
+    Returns:
+        The Retry-After value when it is a finite number, otherwise an exponential
+        backoff with jitter, clamped to between 0 and MAX_RETRY_DELAY seconds.
+    """
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = math.nan
+    if not math.isfinite(delay):
+        delay = 2 ** attempt + random.random()
+    return max(0.0, min(delay, float(MAX_RETRY_DELAY)))
+
+
+def _post_with_backoff(url: str, **kwargs: Any) -> requests.Response:
+    """
+    Sends a POST request, retrying on rate limiting and transient server errors.
+
+    Honours the Retry-After header when present, otherwise backs off exponentially
+    with jitter. Each wait is capped by retry_delay.
+
+    Args:
+        url: The URL to post to.
+        **kwargs: Passed through to requests.Session.post.
+
+    Returns:
+        The successful response.
+
+    Raises:
+        requests.exceptions.HTTPError: If the final response is an HTTP error.
+    """
+    attempt = 0
+    while True:
+        response = _SESSION.post(url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+            response.raise_for_status()  # Raise exception for HTTP errors
+            return response
+
+        delay = retry_delay(response.headers.get("Retry-After"), attempt)
+        logger.warning(f"Spotify returned HTTP {response.status_code}, retrying in {delay:.1f}s.")
+        time.sleep(delay)
+        attempt += 1
+
+
+def _load_cached_token(client_id: str) -> Optional[Tuple[str, int]]:
+    """
+    Reads a token persisted by an earlier call or process.
+
+    Args:
+        client_id: The client ID the token must have been issued for.
+
+    Returns:
+        A tuple of the cached token and its remaining lifetime in seconds, or None if
+        the file is missing, unreadable, malformed, for another client, or the token
+        expires within TOKEN_EXPIRY_MARGIN.
+    """
+    try:
+        cached = orjson.loads(_TOKEN_CACHE_PATH.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+    if not isinstance(cached, dict) or cached.get("client_id") != client_id:
+        return None
+    token = cached.get("token")
+    try:
+        expires_in = int(cached.get("expires_at", 0) - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not isinstance(token, str) or not token or expires_in <= TOKEN_EXPIRY_MARGIN:
+        return None
+    return token, expires_in
+
+
+def _save_cached_token(client_id: str, token: str, expires_in: int) -> None:
+    """
+    Persists a token to disk, atomically and readable by the owner only.
+
+    The token is written to a <pid>.tmp file which then replaces the cache file.
+    Failures are logged and the temporary file removed. A temporary file left over
+    by a crashed process with the same PID makes the first save fail (O_EXCL) and
+    is removed, so the next save succeeds.
+
+    Args:
+        client_id: The client ID the token was issued for.
+        token: The access token.
+        expires_in: The token's lifetime in seconds.
+    """
+    payload = {"client_id": client_id, "token": token, "expires_at": time.time() + expires_in}
+    tmp_path = _TOKEN_CACHE_PATH.with_name(f"{_TOKEN_CACHE_PATH.name}.{os.getpid()}.tmp")
+    try:
+        _TOKEN_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        # Create the file readable by the owner only, so the token is never exposed
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(orjson.dumps(payload))
+        os.replace(tmp_path, _TOKEN_CACHE_PATH)
+    except OSError as e:
+        logger.warning(f"Could not persist Spotify token to {_TOKEN_CACHE_PATH}: {e}")
+        with contextlib.suppress(OSError):
+            tmp_path.unlink()
+
+
+def get_spotify_token(client_id: str, client_secret: str) -> Optional[Tuple[str, int]]:
     """
     Fetches the Spotify access token using Client Credentials.
 
+    A token persisted on disk by an earlier process is reused while it is still
+    valid. If a token request for the same client ID is already in progress,
+    waits for it and returns its result instead of sending another request.
+
     Args:
         client_id: Your Spotify application's client ID.
         client_secret: Your Spotify application's client secret.
 
     Returns:
-        The access token string, or None if an error occurred.
+        A tuple of the access token string and its lifetime in seconds,
+        or None if an error occurred.
+    """
+    cached = _load_cached_token(client_id)
+    if cached:
+        return cached
+
+    with _token_refresh_lock:
+        future = _token_refresh_inflight.get(client_id)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _token_refresh_inflight[client_id] = future
+
+    if not is_owner:
+        return future.result()
+
+    try:
+        result = _request_spotify_token(client_id, client_secret)
+        if result:
+            _save_cached_token(client_id, *result)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _token_refresh_lock:
+            _token_refresh_inflight.pop(client_id, None)
+
+
+def _request_spotify_token(client_id: str, client_secret: str) -> Optional[Tuple[str, int]]:
+    """
+    Requests a new Spotify access token using Client Credentials.
+
+    Args:
+        client_id: Your Spotify application's client ID.
+        client_secret: Your Spotify application's client secret.
+
+    Returns:
+        A tuple of the access token string and its lifetime in seconds,
+        or None if an error occurred.
     """
     if not client_id or not client_secret:
         logger.error("Client ID or Client Secret not provided.")
@@ -34,18 +230,19 @@ def get_spotify_token(client_id: str, client_secret: str) -> Optional[str]:
         headers = {"Authorization": f"Basic {b64_auth_str}"}
         data = {"grant_type": "client_credentials"}
 
-        response = requests.post(SPOTIFY_ACCOUNT_URL, data=data, headers=headers)
-        response.raise_for_status()  # Raise exception for HTTP errors
+        response = _post_with_backoff(get_config().account_url, data=data, headers=headers)
 
-        token_info = response.json()
+        token_info = orjson.loads(response.content)
         access_token = token_info.get("access_token")
         if not access_token:
             logger.error("Access token not found in response.")
             st.error("Could not retrieve access token from Spotify response.")
             return None
 
+        expires_in = int(token_info.get("expires_in", 3600))
+
         logger.info("Successfully obtained Spotify token.")
-        return access_token
+        return access_token, expires_in
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error obtaining Spotify token: {e}")
@@ -56,43 +253,3 @@ def get_spotify_token(client_id: str, client_secret: str) -> Optional[str]:
         st.error("An unexpected error occurred. Check logs.")
         return None
 
-
-def search_tracks(token: str, query: str, limit: int = 50) -> List[Dict[str, Any]]:
-    """
-    Searches for tracks on Spotify.
-
-    Args:
-        token: Spotify API access token.
-        query: The search query string.
-        limit: The maximum number of tracks to return (capped at 50).
-
-    Returns:
-        A list of track dictionaries, or an empty list if an error occurs or no results are found.
-    """
-    if not token:
-        st.error("Invalid or missing Spotify token.")
-        return []
-
-    headers = {"Authorization": f"Bearer {token}"}
-    params = {"q": query, "type": "track", "limit": min(limit, 50)}  # API limit is 50
-
-    print("HEADERS: ", headers)
-    print("params: ", params)
-
-    try:
-        response = requests.get(SEARCH_ENDPOINT, headers=headers, params=params)
-        response.raise_for_status()
-
-        data = response.json()
-        tracks = data.get("tracks", {}).get("items", [])
-        logger.info(f"Found {len(tracks)} tracks for query: '{query}'")
-        return tracks
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error searching tracks: {e}")
-        st.error(f"API error during track search: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"An unexpected error occurred during track search: {e}")
-        st.error("An unexpected error occurred during track search.")
-        return []
\ No newline at end of file